@@ -0,0 +1,241 @@
+"""
+Нагрузочный тест: прогоняет настоящие обработчики из main.py синтетическими
+обновлениями от множества пользователей.
+
+Telegram и Ollama заменены локальными заглушками с настраиваемыми задержками,
+поиск рецептов по умолчанию тоже (--real-rag включает настоящий RAGService).
+Для каждого числа пользователей печатает p50/p95/p99 времени до первого
+редактирования ответа и до финального ответа, а также пропускную способность.
+
+Пример:
+    python loadtest.py --users 1,10,50 --rounds 3 --bot-threads 2
+"""
+
+import argparse
+import itertools
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+
+import ollama
+from loguru import logger
+from telebot import apihelper, types
+
+import src.api_requests
+import src.recommender
+import src.send_requests
+from main import build_bot
+from src.api_requests import ApiExec
+from src.llm import RAGService
+from src.storage import StateStore
+
+
+STUB_CONTEXT = "## Recipe: Pancakes\n\nIngredients:\n- flour\n- milk\n- eggs\n\nInstructions:\nMix and fry."
+# Срок годности в будущем, чтобы продукты не считались просроченными в любой день запуска
+EXPIRES = (date.today() + timedelta(days=30)).strftime("%Y-%m-%d")
+# Конкретный вопрос: общий «что приготовить?» мог взять готовые рекомендации вместо поиска,
+# и результат зависел бы от того, успел ли их посчитать фоновый поток
+QUESTION = "Как приготовить омлет с молоком?"
+
+
+class FakeTelegram:
+    """Заглушка Bot API: отвечает на запросы и запоминает время правок сообщений по чатам."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.message_ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.edits = {}  # {chat_id: [timestamp, ...]}
+
+    def request(self, token, method_name, method="get", params=None, files=None):
+        time.sleep(self.latency)
+        params = params or {}
+        if method_name == "editMessageText":
+            with self.lock:
+                self.edits.setdefault(int(params["chat_id"]), []).append(time.perf_counter())
+            return self._message(params["chat_id"], params.get("text", ""), int(params["message_id"]))
+        if method_name == "sendMessage":
+            return self._message(params["chat_id"], params.get("text", ""), next(self.message_ids))
+        return True
+
+    @staticmethod
+    def _message(chat_id, text, message_id):
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"},
+            "text": text,
+        }
+
+    def edits_since(self, chat_id: int, start: float) -> list[float]:
+        with self.lock:
+            return [t for t in self.edits.get(chat_id, []) if t >= start]
+
+
+def fake_ollama_chat(tokens: int, token_latency: float):
+    def chat(model=None, messages=None, stream=False, **kwargs):
+        if not stream:
+            time.sleep(tokens * token_latency)
+            return {"message": {"content": "ответ " * tokens}}
+
+        def generate():
+            for _ in range(tokens):
+                time.sleep(token_latency)
+                yield {"message": {"content": "ответ "}}
+
+        return generate()
+
+    return chat
+
+
+class StubRAG:
+    """RAGService без Chroma и эмбеддера: контекст фиксированный, генерация через ollama.chat."""
+
+    model = "stub"
+    query_stream = RAGService.query_stream
+    retrieval_latency = 0.0
+
+    def get_context(self, query: str, top_k: int = None, need_to_translate: bool = False) -> str:
+        time.sleep(StubRAG.retrieval_latency)
+        return STUB_CONTEXT
+
+
+class SimulatedUser:
+    update_ids = itertools.count(1)
+
+    def __init__(self, user_id: int, bot, pool: ThreadPoolExecutor, telegram: FakeTelegram):
+        self.user_id = user_id
+        self.fridge_id = f"fridge_{user_id}"
+        self.bot = bot
+        self.pool = pool
+        self.telegram = telegram
+        self.user = {"id": user_id, "is_bot": False, "first_name": "Load", "username": f"user{user_id}"}
+
+    def _message(self, text: str) -> dict:
+        return {
+            "message_id": next(self.update_ids),
+            "date": int(time.time()),
+            "chat": {"id": self.user_id, "type": "private"},
+            "from": self.user,
+            "text": text,
+        }
+
+    def send(self, text: str):
+        self._dispatch({"update_id": next(self.update_ids), "message": self._message(text)})
+
+    def press(self, data: str):
+        self._dispatch({
+            "update_id": next(self.update_ids),
+            "callback_query": {
+                "id": str(next(self.update_ids)),
+                "from": self.user,
+                "chat_instance": str(self.user_id),
+                "data": data,
+                "message": self._message("Выбери действие:"),
+            },
+        })
+
+    def _dispatch(self, update: dict):
+        # Как и в TeleBot(threaded=True), обработчики выполняются общим пулом потоков
+        self.pool.submit(self.bot.process_new_updates, [types.Update.de_json(update)]).result()
+
+    def ask(self):
+        start = time.perf_counter()
+        self.send(QUESTION)
+        edits = self.telegram.edits_since(self.user_id, start)
+        if not edits:
+            return None
+        return edits[0] - start, edits[-1] - start
+
+    def run(self, rounds: int, results: list):
+        for _ in range(rounds):
+            self.send("/start")
+            self.press(f"fridge_{self.fridge_id}")
+            self.press(f"action_add_{self.fridge_id}")
+            for text in ("молоко", "2", "л", EXPIRES):
+                self.send(text)
+            self.press(f"action_remove_{self.fridge_id}")
+            for text in ("молоко", "1"):
+                self.send(text)
+            timing = self.ask()
+            if timing is not None:
+                results.append(timing)
+            self.send("/clear")
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    index = min(int(round(q / 100 * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+def run_level(users: int, args, telegram: FakeTelegram) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        store = StateStore(Path(tmp) / "state.db")
+        seed = ApiExec(None, store)
+        # create_fridge выдаёт fridge_1..fridge_N по порядку, владелец — userN
+        for user_id in range(1, users + 1):
+            seed.create_fridge(f"Холодильник {user_id}", f"user{user_id}")
+            seed.add_product(f"fridge_{user_id}", "яйца", 10, "шт", EXPIRES)
+
+        bot = build_bot("123456:LOADTEST", store, threaded=False)
+        results = []
+        with ThreadPoolExecutor(max_workers=args.bot_threads) as pool:
+            simulated = [SimulatedUser(user_id, bot, pool, telegram) for user_id in range(1, users + 1)]
+            start = time.perf_counter()
+            threads = [threading.Thread(target=u.run, args=(args.rounds, results)) for u in simulated]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - start
+        # Фоновый пересчёт рекомендаций не должен пережить уровень и его временное хранилище
+        bot.my_send.recommender.stop()
+
+    first = [r[0] for r in results]
+    final = [r[1] for r in results]
+    return {
+        "users": users,
+        "answers": len(results),
+        "first": [percentile(first, q) for q in (50, 95, 99)] if first else [0.0] * 3,
+        "final": [percentile(final, q) for q in (50, 95, 99)] if final else [0.0] * 3,
+        "throughput": len(results) / elapsed if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic Telegram load test for Prompt-Pepper handlers")
+    parser.add_argument("--users", default="1,5,10,25,50", help="Comma-separated numbers of concurrent users")
+    parser.add_argument("--rounds", type=int, default=3, help="Scenario repetitions per user")
+    parser.add_argument("--bot-threads", type=int, default=2, help="Handler threads (TeleBot num_threads)")
+    parser.add_argument("--telegram-latency", type=float, default=0.02, help="Seconds per Bot API call")
+    parser.add_argument("--tokens", type=int, default=60, help="Streamed LLM chunks per answer")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="Seconds per LLM chunk")
+    parser.add_argument("--retrieval-latency", type=float, default=0.05, help="Seconds per stub retrieval")
+    parser.add_argument("--real-rag", action="store_true", help="Use the real RAGService retrieval")
+    args = parser.parse_args()
+
+    logger.remove()
+    telegram = FakeTelegram(args.telegram_latency)
+    apihelper._make_request = telegram.request
+    ollama.chat = fake_ollama_chat(args.tokens, args.token_latency)
+    # Данные живут только во временном хранилище, fridges.json не читается
+    src.api_requests.FRIDGE_FILE = Path(tempfile.gettempdir()) / "loadtest-missing-fridges.json"
+    if not args.real_rag:
+        StubRAG.retrieval_latency = args.retrieval_latency
+        src.send_requests.RAGService = StubRAG
+        src.recommender.RAGService = StubRAG
+
+    print(f"{'users':>6} {'answers':>8} {'first p50/p95/p99, s':>24} {'final p50/p95/p99, s':>24} {'answers/s':>10}")
+    for users in [int(u) for u in args.users.split(",")]:
+        r = run_level(users, args, telegram)
+        first = "/".join(f"{v:.2f}" for v in r["first"])
+        final = "/".join(f"{v:.2f}" for v in r["final"])
+        print(f"{r['users']:>6} {r['answers']:>8} {first:>24} {final:>24} {r['throughput']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,107 @@
 import json
+import re
 from copy import deepcopy
 from datetime import datetime
+from functools import wraps
 from pathlib import Path
 
 
 FRIDGE_FILE = Path("./fridges.json")
+# Ключи StateStore: каждый холодильник — отдельный документ, сообщения диалогов — строки таблицы messages
+FRIDGE_PREFIX = "fridge:"
+MIGRATED_KEY = "migrated"
+
+# «молоко 2 л 2026-10-25», «яйца 10», «сыр, 200г», «хлеб»
+PRODUCT_LINE = re.compile(
+    r"^[\s\-•*]*(?P<name>.+?)"
+    r"(?:[\s,:—–-]+(?P<quantity>\d+)\s*(?P<unit>[^\d\s,]+)?)?"
+    r"(?:[\s,:—–-]+(?P<expires>\d{4}-\d{2}-\d{2}))?\s*$"
+)
+# «1,5 л», «2.5 кг» — дробные количества не поддерживаются, такие строки не разбираем
+DECIMAL_NUMBER = re.compile(r"\d[.,]\d")
+
+
+def normalize_name(name: str) -> str:
+    return " ".join(name.casefold().split())
+
+
+def product_index(products: list) -> dict:
+    """Индекс продуктов по нормализованному имени для слияния дублей."""
+    return {normalize_name(p["name"]): p for p in products}
+
+
+def parse_product_line(line: str):
+    """Разбирает строку списка покупок в продукт. Возвращает None, если строка не распознана."""
+    if DECIMAL_NUMBER.search(line):
+        return None
+    match = PRODUCT_LINE.match(line)
+    if not match or not match.group("name").strip():
+        return None
+    expires = match.group("expires")
+    if expires:
+        try:
+            days_until(expires)
+        except ValueError:
+            return None
+    return {
+        "name": match.group("name").strip(),
+        "quantity": int(match.group("quantity") or 1),
+        "unit": match.group("unit") or "шт",
+        "expires": expires,
+    }
+
+
+def days_until(expires: str) -> int:
+    """Дней до конца срока годности (YYYY-MM-DD); ValueError, если дата некорректна."""
+    exp_date = datetime.strptime(expires, "%Y-%m-%d").date()
+    return (exp_date - datetime.today().date()).days
+
+
+def atomic(method):
+    """Выполняет метод в одной транзакции общего хранилища, если оно подключено."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.store is None:
+            return method(self, *args, **kwargs)
+        with self.store.transaction():
+            return method(self, *args, **kwargs)
+    return wrapper
 
 
 class ApiExec:
-    def __init__(self, bot):
+    def __init__(self, bot, store=None):
         self.bot = bot
-        self.data = self.load_data()
+        # store — StateStore, общий для нескольких процессов; без него данные живут в FRIDGE_FILE
+        self.store = store
+        if store is None:
+            self.data = self.load_data()
+        else:
+            self._migrate()
+        # Подписчики на изменения содержимого холодильников: callback(fridge_id)
+        self.listeners = []
+        # Подписчики на удаление холодильников: callback(fridge_id)
+        self.removal_listeners = []
+
+    def _migrate(self):
+        # При первом запуске с общим хранилищем данные переносятся из FRIDGE_FILE
+        with self.store.transaction():
+            if self.store.load(MIGRATED_KEY):
+                return
+            data = self.load_data()
+            for fridge_id, fridge in data.get("fridges", {}).items():
+                self.store.save(FRIDGE_PREFIX + fridge_id, fridge)
+            for user_id, messages in data.get("conversations", {}).items():
+                for m in messages:
+                    self.store.add_message(user_id, m["role"], m["content"])
+            self.store.save(MIGRATED_KEY, True)
+
+    def _notify(self, fridge_id: str):
+        for listener in self.listeners:
+            listener(fridge_id)
+
+    def _notify_removed(self, fridge_id: str):
+        for listener in self.removal_listeners:
+            listener(fridge_id)
 
     def load_data(self):
         if FRIDGE_FILE.exists():
@@ -22,11 +113,38 @@ class ApiExec:
         with open(FRIDGE_FILE, "w", encoding="utf-8") as f:
             json.dump(self.data, f, indent=2, ensure_ascii=False)
 
+    def get_fridge(self, fridge_id: str):
+        if self.store is None:
+            return self.data["fridges"].get(fridge_id)
+        return self.store.load(FRIDGE_PREFIX + fridge_id)
+
+    def _all_fridges(self) -> list[tuple[str, dict]]:
+        if self.store is None:
+            return list(self.data["fridges"].items())
+        return [(key.removeprefix(FRIDGE_PREFIX), fridge) for key, fridge in self.store.load_prefix(FRIDGE_PREFIX)]
+
+    def _save_fridge(self, fridge_id: str, fridge: dict):
+        if self.store is None:
+            self.data["fridges"][fridge_id] = fridge
+            self.save_data()
+        else:
+            self.store.save(FRIDGE_PREFIX + fridge_id, fridge)
+
+    def _delete_fridge(self, fridge_id: str):
+        if self.store is None:
+            del self.data["fridges"][fridge_id]
+            self.save_data()
+        else:
+            self.store.delete(FRIDGE_PREFIX + fridge_id)
+
+    def user_fridges(self, user: str) -> list[tuple[str, str]]:
+        return [(fid, f["name"]) for fid, f in self._all_fridges() if user in f.get("owners")]
+
     def get_name(self, fridge_id: str):
-        return self.data["fridges"].get(fridge_id)["name"]
+        return self.get_fridge(fridge_id)["name"]
 
     def get_list(self, fridge_id: str):
-        fridge = self.data["fridges"].get(fridge_id)
+        fridge = self.get_fridge(fridge_id)
         if not fridge:
             return f"Холодильник {fridge_id} не найден."
 
@@ -35,7 +153,6 @@ class ApiExec:
             return "Продуктов пока нет."
 
         lines = []
-        today = datetime.today().date()
 
         for p in products:
             line = f"{p['name']} — {p['quantity']} {p.get('unit', '')}".strip()
@@ -43,8 +160,7 @@ class ApiExec:
             expires = p.get("expires")
             if expires:
                 try:
-                    exp_date = datetime.strptime(expires, "%Y-%m-%d").date()
-                    days_left = (exp_date - today).days
+                    days_left = days_until(expires)
                     if days_left < 0:
                         line += f" ⛔️ срок вышел ({expires})"
                     elif days_left == 0:
@@ -60,79 +176,112 @@ class ApiExec:
 
         return "\n".join(lines)
 
-    def add_product(self, fridge_id: str, name: str, quantity: int, unit: str = "шт", expires: str = "-"):
-        fridge = self.data["fridges"].get(fridge_id)
-        if not fridge:
-            return f"Холодильник {fridge_id} не найден."
-
-        products = fridge.setdefault("products", [])
-
+    def _put_product(self, products: list, index: dict, name: str, quantity: int, unit: str, expires: str):
         # Проверка: если продукт уже есть → обновляем количество
-        for p in products:
-            if p["name"].lower() == name.lower():
-                p["quantity"] += quantity
-                if expires:  # обновим срок годности, если пришёл
-                    p["expires"] = expires
-                self.save_data()
-                return f"Добавлено {quantity} {unit} к {name}. Теперь всего: {p['quantity']}."
+        p = index.get(normalize_name(name))
+        if p is not None:
+            p["quantity"] += quantity
+            if expires:  # обновим срок годности, если пришёл
+                p["expires"] = expires
+            return f"Добавлено {quantity} {unit} к {name}. Теперь всего: {p['quantity']}."
 
         # Новый продукт
         new_id = max((p["id"] for p in products), default=0) + 1
-        products.append({
+        p = {
             "id": new_id,
             "name": name,
             "quantity": quantity,
             "unit": unit,
             "expires": expires
-        })
-        self.save_data()
-        return f"{name} добавлен в холодильник {fridge['name']}."
+        }
+        products.append(p)
+        index[normalize_name(name)] = p
+        return None
+
+    @atomic
+    def add_product(self, fridge_id: str, name: str, quantity: int, unit: str = "шт", expires: str = "-"):
+        fridge = self.get_fridge(fridge_id)
+        if not fridge:
+            return f"Холодильник {fridge_id} не найден."
 
+        products = fridge.setdefault("products", [])
+        result = self._put_product(products, product_index(products), name, quantity, unit, expires)
+        self._save_fridge(fridge_id, fridge)
+        self._notify(fridge_id)
+        return result or f"{name} добавлен в холодильник {fridge['name']}."
+
+    @atomic
+    def add_products(self, fridge_id: str, items: list[dict]):
+        """Добавляет сразу много продуктов одной записью. items — результат parse_product_line."""
+        fridge = self.get_fridge(fridge_id)
+        if not fridge:
+            return f"Холодильник {fridge_id} не найден."
+
+        products = fridge.setdefault("products", [])
+        index = product_index(products)
+        lines = []
+        for item in items:
+            result = self._put_product(
+                products, index, item["name"], item["quantity"], item.get("unit", "шт"), item.get("expires"))
+            lines.append(result or f"{item['name']} — {item['quantity']} {item.get('unit', 'шт')}")
+        self._save_fridge(fridge_id, fridge)
+        self._notify(fridge_id)
+        return f"✅ Добавлено продуктов: {len(items)} в холодильник {fridge['name']}.\n" + "\n".join(lines)
+
+    @atomic
     def remove_product(self, fridge_id: str, name: str, quantity: int):
-        fridge = self.data["fridges"].get(fridge_id)
+        fridge = self.get_fridge(fridge_id)
         if not fridge:
             return f"Холодильник {fridge_id} не найден."
 
         products = fridge.get("products", [])
 
         for p in products:
-            if p["name"].lower() == name.lower():
+            if normalize_name(p["name"]) == normalize_name(name):
                 if p["quantity"] <= quantity:
                     products.remove(p)
-                    self.save_data()
+                    self._save_fridge(fridge_id, fridge)
+                    self._notify(fridge_id)
                     return f"{name} полностью удалён из холодильника."
                 else:
                     p["quantity"] -= quantity
-                    self.save_data()
+                    self._save_fridge(fridge_id, fridge)
+                    self._notify(fridge_id)
                     return f"Удалено {quantity} из {name}. Осталось {p['quantity']}."
 
         return f"{name} не найден в холодильнике."
 
     def check_admin(self, fridge_id: str, user: str):
-        fridge = self.data["fridges"].get(fridge_id)
+        fridge = self.get_fridge(fridge_id)
         if not fridge:
             return False
         return user in fridge.get("owners")
     
+    @atomic
     def create_fridge(self, name: str, owner: str):
-        fridges = self.data["fridges"]
-        new_id = f"fridge_{len(fridges) + 1}"
-        fridges[new_id] = {"name": name, "owners": [owner], "products": []}
-        self.save_data()
+        # Номер больше максимального: len() + 1 после удаления совпал бы с существующим холодильником
+        numbers = [int(fid.removeprefix("fridge_")) for fid, _ in self._all_fridges()
+                   if fid.removeprefix("fridge_").isdigit()]
+        new_id = f"fridge_{max(numbers, default=0) + 1}"
+        self._save_fridge(new_id, {"name": name, "owners": [owner], "products": []})
+        self._notify(new_id)
         return f"🆕 Холодильник «{name}» создан (ID: {new_id})"
 
+    @atomic
     def remove_fridge(self, fridge_id: str, user: str):
-        fridge = self.data["fridges"].get(fridge_id)
+        fridge = self.get_fridge(fridge_id)
         if not fridge:
             return f"❌ Холодильник {fridge_id} не найден."
         if user not in fridge.get("owners"):
             return "❌ Только владелец может удалить холодильник."
-        del self.data["fridges"][fridge_id]
-        self.save_data()
+        self._delete_fridge(fridge_id)
+        self._notify_removed(fridge_id)
         return f"❌ Холодильник «{fridge['name']}» удалён."
 
     def get_conversation(self, user_id: str) -> list[dict[str, str]]:
         user_id = str(user_id)
+        if self.store is not None:
+            return self.store.get_messages(user_id)
         if user_id not in self.data["conversations"]:
             self.data["conversations"][user_id] = []
             self.save_data()
@@ -140,12 +289,19 @@ class ApiExec:
 
     def clear_conversation(self, user_id: str) -> str:
         user_id = str(user_id)
+        if self.store is not None:
+            self.store.clear_messages(user_id)
+            return "История диалога очищена."
         self.data["conversations"][user_id] = []
         self.save_data()
         return "История диалога очищена."
     
     def add_to_conversation(self, user_id: str, role: str, message: str) -> str:
         user_id = str(user_id)
+        if self.store is not None:
+            # Одна строка на сообщение: история не перезаписывается целиком
+            self.store.add_message(user_id, role, message)
+            return "Сообщения добавлены в историю диалога."
         if user_id not in self.data["conversations"]:
             self.data["conversations"][user_id] = []
         self.data["conversations"][user_id].append({"role": role, "content": message})
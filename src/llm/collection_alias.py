@@ -0,0 +1,51 @@
+"""
+Collection aliases for blue-green index rebuilds.
+
+The alias file maps a logical collection name (COLLECTION_NAME) to the
+versioned Chroma collection that currently serves queries. It is replaced
+atomically, so readers always see either the old or the new target.
+"""
+
+import json
+import os
+from pathlib import Path
+
+
+ALIAS_FILE = "aliases.json"
+
+
+def alias_path(chroma_path: str) -> Path:
+    return Path(chroma_path) / ALIAS_FILE
+
+
+def read_aliases(chroma_path: str) -> dict:
+    path = alias_path(chroma_path)
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def resolve_collection(chroma_path: str, name: str) -> str:
+    """Return the collection an alias points to, or the name itself if there is no alias."""
+    return read_aliases(chroma_path).get(name, name)
+
+
+def alias_mtime(chroma_path: str) -> float:
+    try:
+        return os.stat(alias_path(chroma_path)).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def switch_alias(chroma_path: str, name: str, target: str):
+    """Atomically point the alias to the target collection."""
+    aliases = read_aliases(chroma_path)
+    aliases[name] = target
+    path = alias_path(chroma_path)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(aliases, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
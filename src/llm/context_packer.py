@@ -0,0 +1,122 @@
+"""
+Context packing for retrieved recipes.
+
+Picks diverse recipes with maximal marginal relevance (MMR) and trims each
+of them to its most relevant sections so the whole context fits a token budget.
+"""
+
+import re
+from typing import Callable, Optional
+
+import numpy as np
+
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    """Rough token estimate: words and punctuation marks."""
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def mmr(query_embedding, embeddings, k: int, lambda_mult: float = 0.5) -> list[int]:
+    """
+    Select k items by maximal marginal relevance.
+
+    Args:
+        query_embedding: Query vector
+        embeddings: Candidate vectors, ordered by retrieval rank
+        k: Number of items to select
+        lambda_mult: 1.0 means pure relevance, 0.0 means pure diversity
+
+    Returns:
+        Indices of the selected candidates in selection order
+    """
+    if len(embeddings) == 0:
+        return []
+
+    query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+    candidates = _normalize(np.asarray(embeddings, dtype=np.float32))
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    while len(selected) < min(k, len(candidates)):
+        redundancy = similarity[:, selected].max(axis=1)
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        selected.append(int(np.argmax(scores)))
+    return selected
+
+
+def trim_recipe(document: str, budget: int, scorer: Optional[Callable[[list[str]], list[float]]] = None) -> str:
+    """
+    Trim a recipe to a token budget, keeping its most relevant sections.
+
+    Sections are blank-line separated paragraphs. The first one (the title) is
+    always kept; the rest are taken by scorer relevance, or in order if no
+    scorer is given. A section that does not fit is cut line by line.
+    """
+    sections = [s for s in document.split("\n\n") if s.strip()]
+    if not sections or count_tokens(document) <= budget:
+        return document
+
+    title, rest = sections[0], sections[1:]
+    order = list(range(len(rest)))
+    if scorer is not None and rest:
+        scores = scorer(rest)
+        order.sort(key=lambda i: scores[i], reverse=True)
+
+    left = budget - count_tokens(title)
+    kept = {}
+    for i in order:
+        if left <= 0:
+            break
+        cost = count_tokens(rest[i])
+        if cost <= left:
+            kept[i] = rest[i]
+            left -= cost
+            continue
+        lines, spent = [], 0
+        for line in rest[i].split("\n"):
+            cost = count_tokens(line)
+            if spent + cost > left:
+                break
+            lines.append(line)
+            spent += cost
+        # A lone section header is useless without its content
+        if len(lines) > 1:
+            kept[i] = "\n".join(lines + ["..."])
+            left -= spent
+
+    return "\n\n".join([title] + [kept[i] for i in sorted(kept)])
+
+
+def pack_context(
+    documents: list[str],
+    budget: int,
+    scorer: Optional[Callable[[list[str]], list[float]]] = None,
+    use_scorer: Optional[list[bool]] = None,
+) -> str:
+    """
+    Join recipes into a "## "-separated context within a total token budget.
+
+    Args:
+        documents: Recipes in the order they should appear
+        budget: Token budget for the whole context, split evenly between recipes
+        scorer: Section relevance function passed to trim_recipe
+        use_scorer: Per-document flags telling whether scorer applies (all by default)
+    """
+    if not documents:
+        return ""
+    if use_scorer is None:
+        use_scorer = [True] * len(documents)
+    per_recipe = max(budget // len(documents), 1)
+    trimmed = [trim_recipe(document, per_recipe, scorer if scored else None)
+               for document, scored in zip(documents, use_scorer)]
+    return "## " + "\n\n## ".join(trimmed)
@@ -3,11 +3,15 @@ import sys
 from typing import AsyncGenerator, Generator, Optional
 
 import chromadb
+import numpy as np
 import ollama
 from dotenv import load_dotenv
 from loguru import logger
 from sentence_transformers import SentenceTransformer
 
+from .collection_alias import alias_mtime, resolve_collection
+from .context_packer import mmr, pack_context
+
 
 logger.remove()
 logger.add(sys.stdout, level="INFO")
@@ -29,20 +33,45 @@ class RAGService(metaclass=Singleton):
     CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_db")
     COLLECTION_NAME = os.getenv("COLLECTION_NAME", "recipes")
     TOP_K_RESULTS = int(os.getenv("TOP_K_RESULTS", "3"))
+    FETCH_K_MULTIPLIER = int(os.getenv("FETCH_K_MULTIPLIER", "4"))
+    MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.5"))
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
 
     def __init__(self):
         self.client = chromadb.PersistentClient(path=RAGService.CHROMA_PATH)
+        self.model = RAGService.LLM_MODEL
+        self.collection = None
+        self.embedder = None
+        self.embedding_model = None
+        self._alias_mtime = None
+        self._refresh_collection()
+
+    def _refresh_collection(self):
+        # Пересборка индекса переключает алиас — подхватываем новую коллекцию без перезапуска
+        mtime = alias_mtime(RAGService.CHROMA_PATH)
+        if mtime == self._alias_mtime:
+            return
+        name = resolve_collection(RAGService.CHROMA_PATH, RAGService.COLLECTION_NAME)
 
         try:
-            self.collection = self.client.get_collection(RAGService.COLLECTION_NAME)
+            collection = self.client.get_collection(name)
         except Exception as e:
+            if self.collection is not None:
+                logger.error(f"Collection '{name}' not available, keep serving '{self.collection.name}': {e}")
+                return
             raise RuntimeError(
                 f"Collection '{RAGService.COLLECTION_NAME}' not found. "
                 f"Run 'python -m llm.setup_db' first to initialize the database."
             ) from e
 
-        self.embedder = SentenceTransformer(RAGService.EMBEDDING_MODEL)
-        self.model = RAGService.LLM_MODEL
+        embedder = self.embedder
+        embedding_model = (collection.metadata or {}).get("embedding_model", RAGService.EMBEDDING_MODEL)
+        if embedding_model != self.embedding_model:
+            embedder = SentenceTransformer(embedding_model)
+        # Коллекция и эмбеддер меняются вместе, чтобы запрос не смешал старую модель с новым индексом
+        self.collection, self.embedder, self.embedding_model = collection, embedder, embedding_model
+        self._alias_mtime = mtime
+        logger.info(f"Serving collection '{name}'")
 
     def get_context(self, query: str, top_k: int = None, need_to_translate: bool = False) -> str:
         if need_to_translate:
@@ -67,38 +96,41 @@ class RAGService(metaclass=Singleton):
         if top_k is None:
             top_k = RAGService.TOP_K_RESULTS
 
-        query_emb = self.embedder.encode([query])[0]
-        results = self.collection.query(
+        self._refresh_collection()
+        collection, embedder = self.collection, self.embedder
+
+        query_emb = embedder.encode([query])[0]
+        # Берём кандидатов с запасом и выбираем из них непохожие друг на друга рецепты
+        results = collection.query(
             query_embeddings=[query_emb.tolist()],
-            n_results=top_k
+            n_results=top_k * RAGService.FETCH_K_MULTIPLIER,
+            include=["documents", "metadatas", "embeddings"]
         )
-        documents = results["documents"][0]
+        selected = mmr(query_emb, results["embeddings"][0], top_k, RAGService.MMR_LAMBDA)
+        documents = [results["documents"][0][i] for i in selected]
+        metadatas = [results["metadatas"][0][i] or {} for i in selected]
 
-        need_to_translate = False
+        # Русские версии рецептов готовятся заранее: python -m src.llm.setup_db --translate
+        # Секции ранжируются эмбеддером только для английского текста
+        use_scorer = [True] * len(documents)
         if need_to_translate:
-            translated_documents = []
-            for document in documents:
-                system_prompt =  "Ты переводчик. Твоя задача перевести данные тебе рецепт с английского на русский. " + \
-                "Твой ответ должен быть полностью на русском. " + \
-                    "В твоём ответе не должно быть ничего кроме переводённого рецепта.\n" + \
-                    f"Рецепт:\n {document} \n\n" + \
-                    "Твой ответ: "
-                query_for_translater = [{"role": "user", "content": system_prompt}]
-                logger.info(f"System prompt sent to LLM: {query_for_translater[0]['content']}")
-                stream = ollama.chat(
-                        model=self.model,
-                        messages=query_for_translater,
-                        stream=True
-                )
-                translated = ''
-                for chunk in stream:
-                    if "message" in chunk and "content" in chunk["message"]:
-                        translated += chunk["message"]["content"]
-                translated_documents.append(translated)
-            logger.info(f"Translated recepies: {translated_documents}")
-            documents = translated_documents
-        context = "## " + "\n\n## ".join(documents)
-        return context
+            use_scorer = [not metadata.get("document_ru") for metadata in metadatas]
+            documents = [metadata.get("document_ru") or document
+                         for document, metadata in zip(documents, metadatas)]
+
+        return pack_context(
+            documents, RAGService.CONTEXT_TOKEN_BUDGET, self._section_scorer(embedder, query_emb),
+            use_scorer=use_scorer)
+
+    @staticmethod
+    def _section_scorer(embedder, query_emb):
+        query = query_emb / max(np.linalg.norm(query_emb), 1e-12)
+
+        def score(sections: list[str]) -> list[float]:
+            embeddings = embedder.encode(sections, normalize_embeddings=True)
+            return (embeddings @ query).tolist()
+
+        return score
 
     def query_stream(self, query: list[dict[str, str]]) -> Generator[str, None, None]:
         try:
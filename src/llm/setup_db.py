@@ -4,16 +4,24 @@ Run this to initialize the vector database with recipe embeddings.
 """
 
 import ast
+import hashlib
+import random
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
 from os import getenv
 
 import chromadb
 import kagglehub
+import ollama
 from datasets import Dataset, load_dataset
 from dotenv import load_dotenv
 from kagglehub import KaggleDatasetAdapter
 from sentence_transformers import SentenceTransformer
 from tqdm import tqdm
 
+from .collection_alias import resolve_collection, switch_alias
+
 
 def parse_r_list(text):
     """Parse list string (Python style or R-style) to Python list."""
@@ -45,12 +53,153 @@ def parse_r_list(text):
     return items
 
 
-def setup_database(force_rebuild: bool = False):
+def translate_recipe(document: str, model: str) -> str:
+    """Translate one recipe to Russian with the LLM."""
+    system_prompt = "Ты переводчик. Твоя задача перевести данные тебе рецепт с английского на русский. " + \
+        "Твой ответ должен быть полностью на русском. " + \
+        "В твоём ответе не должно быть ничего кроме переводённого рецепта.\n" + \
+        f"Рецепт:\n {document} \n\n" + \
+        "Твой ответ: "
+    response = ollama.chat(model=model, messages=[{"role": "user", "content": system_prompt}])
+    return response["message"]["content"].strip()
+
+
+class TranslationCache:
+    """SQLite cache of recipe translations keyed by content hash."""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS translations (hash TEXT PRIMARY KEY, text TEXT NOT NULL)")
+
+    @staticmethod
+    def key(document: str) -> str:
+        return hashlib.sha256(document.encode("utf-8")).hexdigest()
+
+    def get(self, document: str):
+        row = self.conn.execute("SELECT text FROM translations WHERE hash = ?", (self.key(document),)).fetchone()
+        return row[0] if row else None
+
+    def put(self, document: str, text: str):
+        self.conn.execute("INSERT OR REPLACE INTO translations (hash, text) VALUES (?, ?)", (self.key(document), text))
+        self.conn.commit()
+
+
+def translate_collection(collection, workers: int = None, batch_size: int = 100):
+    """
+    Store a Russian rendering of every recipe in its metadata ("document_ru").
+
+    Resumable: recipes that already have a translation are skipped, and every
+    finished translation is written to the cache right away, so an interrupted
+    run continues where it stopped. Identical texts are translated only once.
+
+    Args:
+        collection: Chroma collection with English recipes
+        workers: Number of parallel Ollama requests (TRANSLATE_WORKERS by default)
+        batch_size: Number of recipes read and updated at once
+    """
+
+    LLM_MODEL = getenv("LLM_MODEL", "gemma2")
+    TRANSLATION_CACHE = getenv("TRANSLATION_CACHE", "./translations.db")
+    if workers is None:
+        workers = int(getenv("TRANSLATE_WORKERS", "2"))
+
+    cache = TranslationCache(TRANSLATION_CACHE)
+    total = collection.count()
+    translated = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for offset in tqdm(range(0, total, batch_size), desc="Translating recipes"):
+            batch = collection.get(limit=batch_size, offset=offset, include=["documents", "metadatas"])
+
+            ids, documents, metadatas, pending = [], [], [], {}
+            for recipe_id, document, metadata in zip(batch["ids"], batch["documents"], batch["metadatas"]):
+                if metadata.get("document_ru"):
+                    continue
+                cached = cache.get(document)
+                if cached is None and document not in pending:
+                    pending[document] = pool.submit(translate_recipe, document, LLM_MODEL)
+                ids.append(recipe_id)
+                documents.append(document)
+                metadatas.append({**metadata, "document_ru": cached})
+
+            for recipe_id, document, metadata in zip(ids, documents, metadatas):
+                if metadata["document_ru"] is not None:
+                    continue
+                try:
+                    text = pending[document].result()
+                except Exception as e:
+                    print(f"Failed to translate {recipe_id}: {e}")
+                    text = None
+                if text:
+                    cache.put(document, text)
+                metadata["document_ru"] = text
+
+            # Recipes whose translation failed stay untouched and are retried next run
+            done = [(i, m) for i, m in zip(ids, metadatas) if m["document_ru"]]
+            if done:
+                collection.update(ids=[i for i, _ in done], metadatas=[m for _, m in done])
+                translated += len(done)
+
+    print(f"✓ Translated {translated} recipes")
+
+
+def validate_collection(collection, expected_count: int, embedder, sample_size: int = 20, top_k: int = 5) -> bool:
+    """
+    Check a freshly built collection before it starts serving queries.
+
+    Verifies the recipe count and a sample-query recall: every sampled recipe
+    document, re-encoded with the embedder that built the collection, should
+    bring the recipe back within its top_k results.
+    """
+    MIN_RECALL = float(getenv("MIN_RECALL", "0.9"))
+
+    count = collection.count()
+    if count == 0 or count != expected_count:
+        print(f"✗ Validation failed: expected {expected_count} recipes, found {count}")
+        return False
+
+    offsets = random.sample(range(count), min(sample_size, count))
+    samples = [collection.get(limit=1, offset=offset, include=["documents"]) for offset in offsets]
+    # Encode the same way queries are encoded, so a broken model or stored vector shows up here
+    query_embeddings = embedder.encode([sample["documents"][0] for sample in samples], show_progress_bar=False)
+    results = collection.query(query_embeddings=query_embeddings.tolist(), n_results=top_k)
+    hits = sum(sample["ids"][0] in ids for sample, ids in zip(samples, results["ids"]))
+
+    recall = hits / len(offsets)
+    print(f"Sample recall@{top_k}: {recall:.2f} ({hits}/{len(offsets)})")
+    if recall < MIN_RECALL:
+        print(f"✗ Validation failed: recall below {MIN_RECALL}")
+        return False
+    return True
+
+
+def drop_old_collections(client, name: str, keep: list[str]):
+    """Delete the legacy and versioned collections behind an alias, except those in keep."""
+    for collection in client.list_collections():
+        collection_name = getattr(collection, "name", collection)
+        if collection_name in keep:
+            continue
+        if collection_name == name or collection_name.startswith(f"{name}_v"):
+            print(f"Deleting old collection '{collection_name}'...")
+            client.delete_collection(collection_name)
+
+
+def setup_database(force_rebuild: bool = False, translate: bool = False, rebuild_on_model_change: bool = False):
     """
     Initialize ChromaDB with recipe embeddings.
 
+    Rebuilds go into a new versioned collection while the current one keeps
+    serving. The alias switches to the new collection only after it passes
+    validation; the previous collection is kept for rollback.
+
+    At bot startup (default arguments) an existing collection is always served
+    as is; only an empty database is built in place. Rebuilds belong to the
+    offline job: python -m src.llm.setup_db [--force] [--translate]
+
     Args:
-        force_rebuild: If True, delete existing collection and rebuild from scratch
+        force_rebuild: If True, rebuild the index from scratch
+        translate: If True, run the offline Russian translation job afterwards
+        rebuild_on_model_change: If True, rebuild when EMBEDDING_MODEL differs from the served collection
     """
 
     EMBEDDING_MODEL = getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
@@ -66,23 +215,33 @@ def setup_database(force_rebuild: bool = False):
     # Connect to persistent ChromaDB
     client = chromadb.PersistentClient(path=CHROMA_PATH)
 
-    # Check if collection exists
+    # Check if the serving collection exists and matches the embedding model
+    active_name = resolve_collection(CHROMA_PATH, COLLECTION_NAME)
     try:
-        collection = client.get_collection(COLLECTION_NAME)
-        if not force_rebuild:
-            count = collection.count()
-            print(f"✓ Collection '{COLLECTION_NAME}' already exists with {count} recipes")
-            print("Use force_rebuild=True to rebuild from scratch")
-            return
-        else:
-            print(f"Deleting existing collection '{COLLECTION_NAME}'...")
-            client.delete_collection(COLLECTION_NAME)
+        active = client.get_collection(active_name)
     except Exception:
-        pass
+        active = None
+
+    if active is not None and not force_rebuild:
+        active_model = (active.metadata or {}).get("embedding_model", EMBEDDING_MODEL)
+        if active_model == EMBEDDING_MODEL or not rebuild_on_model_change:
+            count = active.count()
+            print(f"✓ Collection '{active_name}' already exists with {count} recipes")
+            if active_model != EMBEDDING_MODEL:
+                # RAGService serves it with the model it was built with
+                print(f"⚠ Collection was built with '{active_model}', not '{EMBEDDING_MODEL}'. "
+                      "Run 'python -m src.llm.setup_db' to rebuild it in the background")
+            else:
+                print("Use force_rebuild=True to rebuild from scratch")
+            if translate:
+                translate_collection(active)
+            return
+        print(f"Embedding model changed ({active_model} -> {EMBEDDING_MODEL}), rebuilding...")
 
-    # Create new collection
-    print(f"Creating new collection '{COLLECTION_NAME}'...")
-    collection = client.create_collection(COLLECTION_NAME)
+    # Build into a shadow collection, the active one keeps serving
+    shadow_name = f"{COLLECTION_NAME}_v{time.strftime('%Y%m%d%H%M%S')}"
+    print(f"Creating new collection '{shadow_name}'...")
+    collection = client.create_collection(shadow_name, metadata={"embedding_model": EMBEDDING_MODEL})
 
     # Load dataset
     print(f"Loading dataset '{DATASET_NAME}'...")
@@ -164,11 +323,30 @@ def setup_database(force_rebuild: bool = False):
         recipe_id += len(texts)
 
     final_count = collection.count()
-    print(f"\n✓ Database setup complete! Added {final_count} recipes")
+    print(f"\n✓ Added {final_count} recipes to '{shadow_name}'")
+
+    if not validate_collection(collection, recipe_id, embedder):
+        client.delete_collection(shadow_name)
+        if active is not None:
+            print(f"✗ Collection '{shadow_name}' failed validation, '{active_name}' is still serving")
+        else:
+            print(f"✗ Collection '{shadow_name}' failed validation, no collection is serving")
+        return
+
+    # Translate before the switch so the new index serves Russian context at once
+    if translate:
+        translate_collection(collection)
+
+    switch_alias(CHROMA_PATH, COLLECTION_NAME, shadow_name)
+    print(f"✓ Database setup complete! '{COLLECTION_NAME}' now points to '{shadow_name}'")
+
+    keep = [shadow_name] + ([active_name] if active is not None else [])
+    drop_old_collections(client, COLLECTION_NAME, keep)
 
 
 if __name__ == "__main__":
     import sys
     force = "--force" in sys.argv
+    translate = "--translate" in sys.argv
     load_dotenv()
-    setup_database(force_rebuild=force)
+    setup_database(force_rebuild=force, translate=translate, rebuild_on_model_change=True)
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import queue
+import re
+import threading
+
+from loguru import logger
+
+from src.api_requests import days_until, normalize_name
+from src.llm import RAGService
+
+
+# Общий вопрос «что приготовить?» без конкретного блюда или продукта:
+# на него подходят рецепты, заранее подобранные по содержимому холодильника
+GENERIC_ASK = re.compile(
+    r"(что|чего) (бы )?(мне |нам )?(можно )?(сегодня )?(приготовить|сготовить|поесть|сделать)"
+    r"( сегодня)?( на (завтрак|обед|ужин|перекус))?( сегодня)?"
+    r"( из (того|того что есть|того что у меня есть|продуктов|моих продуктов|холодильника|что есть))?"
+)
+
+
+def is_generic_ask(text: str) -> bool:
+    normalized = " ".join(re.sub(r"[^\w\s]", " ", text.lower().replace("ё", "е")).split())
+    return GENERIC_ASK.fullmatch(normalized) is not None
+
+
+class Recommender:
+    """
+    Фоновый расчёт рекомендаций рецептов для холодильников.
+
+    ApiExec сообщает об изменении холодильника, воркер пересчитывает для него
+    подходящие рецепты (продукты с истекающим сроком в приоритете) и сохраняет
+    их вместе с отпечатком содержимого. Пока содержимое не изменилось,
+    рекомендации отдаются сразу, без поиска.
+    """
+
+    KEY_PREFIX = "recommendations:"
+
+    def __init__(self, api, store=None):
+        self.api = api
+        # С общим хранилищем рекомендации видят все webhook-воркеры
+        self.store = store
+        self.cache = {}
+        self.queue = queue.Queue()
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def classify(products: list) -> tuple[list[str], list[str]]:
+        """Делит продукты на срочные (срок меньше недели) и остальные; просроченные отбрасывает."""
+        urgent, rest = [], []
+        for p in products:
+            expires = p.get("expires")
+            try:
+                days_left = days_until(expires) if expires else None
+            except ValueError:
+                days_left = None
+            if days_left is None or days_left >= 7:
+                rest.append(p["name"])
+            elif days_left >= 0:  # просроченное не предлагаем
+                urgent.append(p["name"])
+        return urgent, rest
+
+    @classmethod
+    def fingerprint(cls, products: list) -> str:
+        # Срочность зависит от сегодняшней даты, поэтому она тоже входит в отпечаток:
+        # продукт, ставший срочным или просроченным, вызывает пересчёт
+        items = sorted(
+            (normalize_name(p["name"]), p["quantity"], p.get("unit") or "", p.get("expires") or "")
+            for p in products
+        )
+        urgent, rest = cls.classify(products)
+        payload = [items, sorted(urgent), sorted(rest)]
+        return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    @classmethod
+    def build_query(cls, products: list):
+        """Запрос для поиска рецептов: скоро портящиеся продукты упоминаются первыми и дважды."""
+        urgent, rest = cls.classify(products)
+        if not urgent and not rest:
+            return None
+        if not urgent:
+            return f"Что приготовить из: {', '.join(rest)}?"
+        query = f"Что приготовить с {', '.join(urgent)}? Нужно срочно использовать: {', '.join(urgent)}."
+        if rest:
+            query += f" Также есть: {', '.join(rest)}."
+        return query
+
+    @staticmethod
+    def parse_titles(context: str) -> list[str]:
+        titles = []
+        for block in context.split("\n\n## "):
+            title = block.removeprefix("## ").split("\n", 1)[0].strip()
+            for prefix in ("Recipe:", "Рецепт:"):
+                title = title.removeprefix(prefix).strip()
+            if title:
+                titles.append(title)
+        return titles
+
+    def schedule(self, fridge_id: str):
+        with self.lock:
+            if fridge_id in self.pending:
+                return
+            self.pending.add(fridge_id)
+        self.queue.put(fridge_id)
+
+    def forget(self, fridge_id: str):
+        """Удаляет рекомендации удалённого холодильника."""
+        if self.store is not None:
+            self.store.delete(self.KEY_PREFIX + fridge_id)
+        else:
+            self.cache.pop(fridge_id, None)
+
+    def get(self, fridge_id: str):
+        """Рекомендации для текущего содержимого холодильника или None, если они ещё считаются."""
+        fridge = self.api.get_fridge(fridge_id)
+        if not fridge:
+            return None
+        entry = self._load(fridge_id)
+        if entry and entry["fingerprint"] == self.fingerprint(fridge.get("products", [])):
+            return entry
+        self.schedule(fridge_id)
+        return None
+
+    def _load(self, fridge_id: str):
+        if self.store is not None:
+            return self.store.load(self.KEY_PREFIX + fridge_id)
+        return self.cache.get(fridge_id)
+
+    def _save(self, fridge_id: str, entry: dict):
+        if self.store is not None:
+            self.store.save(self.KEY_PREFIX + fridge_id, entry)
+        else:
+            self.cache[fridge_id] = entry
+
+    def stop(self):
+        """Останавливает воркер после уже поставленных в очередь пересчётов."""
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            fridge_id = self.queue.get()
+            if fridge_id is None:
+                return
+            with self.lock:
+                self.pending.discard(fridge_id)
+            try:
+                self._compute(fridge_id)
+            except Exception as e:
+                logger.error(f"Error computing recommendations for {fridge_id}: {e}")
+
+    def _compute(self, fridge_id: str):
+        fridge = self.api.get_fridge(fridge_id)
+        if not fridge:
+            self.forget(fridge_id)
+            return
+        products = fridge.get("products", [])
+        fingerprint = self.fingerprint(products)
+        entry = self._load(fridge_id)
+        if entry and entry["fingerprint"] == fingerprint:
+            return
+
+        query = self.build_query(products)
+        context = RAGService().get_context(query, need_to_translate=True) if query else ""
+        self._save(fridge_id, {
+            "fingerprint": fingerprint,
+            "context": context,
+            "titles": self.parse_titles(context) if context else [],
+        })
+        logger.info(f"Recommendations for {fridge_id} updated")
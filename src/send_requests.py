@@ -3,14 +3,21 @@ import json
 from telebot import types
 from loguru import logger
 
-from src.api_requests import ApiExec
+from src.api_requests import ApiExec, parse_product_line
 from src.llm import RAGService
+from src.recommender import Recommender, is_generic_ask
+from src.storage import UserStates
 
 
 class SendExec:
-    def __init__(self, bot):
-        self.my_api = ApiExec(bot)
-        self.user_states = {}  # {user_id: {step, fridge_id, action, data}}
+    def __init__(self, bot, store=None):
+        self.my_api = ApiExec(bot, store)
+        # {user_id: {step, fridge_id, action, data}}; с общим хранилищем состояния видны всем воркерам
+        self.user_states = UserStates(store) if store is not None else {}
+        # Рецепты для холодильников пересчитываются в фоне при каждом изменении продуктов
+        self.recommender = Recommender(self.my_api, store)
+        self.my_api.listeners.append(self.recommender.schedule)
+        self.my_api.removal_listeners.append(self.recommender.forget)
 
     def escape_markdown(self, text: str) -> str:
         escape_chars = {
@@ -40,8 +47,7 @@ class SendExec:
     # --- Показать холодильники + кнопки "новый/удалить" ---
     def show_fridges_buttons(self, message):
         user = message.from_user.username
-        data = self.my_api.data
-        fridges = [(fid, f['name']) for fid, f in data.get("fridges", {}).items() if user in f.get("owners")]
+        fridges = self.my_api.user_fridges(user)
 
         markup = types.InlineKeyboardMarkup()
         for fid, name in fridges:
@@ -66,9 +72,14 @@ class SendExec:
         product_list = self.my_api.get_list(fridge_id)
         fridge_name = self.my_api.get_name(fridge_id)
         self.my_api.bot.send_message(call.message.chat.id, f"📦 Продукты холодильника {fridge_name}:\n{product_list}")
+        recommendation = self.recommender.get(fridge_id)
+        if recommendation and recommendation["titles"]:
+            titles = "\n".join(f"• {title}" for title in recommendation["titles"])
+            self.my_api.bot.send_message(call.message.chat.id, f"🍳 Можно приготовить:\n{titles}")
         self.my_api.bot.answer_callback_query(call.id)
         markup = types.InlineKeyboardMarkup()
         markup.add(types.InlineKeyboardButton("➕ Добавить продукт", callback_data=f"action_add_{fridge_id}"))
+        markup.add(types.InlineKeyboardButton("📝 Добавить списком", callback_data=f"action_bulk_{fridge_id}"))
         markup.add(types.InlineKeyboardButton("➖ Удалить продукт", callback_data=f"action_remove_{fridge_id}"))
         markup.add(types.InlineKeyboardButton("📦 Показать продукты", callback_data=f"action_list_{fridge_id}"))
 
@@ -85,8 +96,7 @@ class SendExec:
     # --- Callback: удалить холодильник (показать список) ---
     def handle_delete_fridge(self, call):
         user = call.from_user.username
-        data = self.my_api.data
-        fridges = [(fid, f['name']) for fid, f in data.get("fridges", {}).items() if user in f.get("owners")]
+        fridges = self.my_api.user_fridges(user)
 
         if not fridges:
             self.my_api.bot.send_message(call.message.chat.id, "❌ У тебя нет холодильников для удаления")
@@ -120,6 +130,16 @@ class SendExec:
             self.my_api.bot.answer_callback_query(call.id)
             return
 
+        if action == "bulk":
+            self.user_states[user_id] = {"step": "list", "fridge_id": fridge_id, "action": action}
+            self.my_api.bot.send_message(
+                call.message.chat.id,
+                "✍️ Пришли список продуктов, по одному на строку:\n"
+                "название количество (целое число) единица срок (YYYY-MM-DD)\n"
+                "Например:\nмолоко 2 л 2026-10-25\nяйца 10\nхлеб")
+            self.my_api.bot.answer_callback_query(call.id)
+            return
+
         # сохраняем состояние
         self.user_states[user_id] = {"step": "name", "fridge_id": fridge_id, "action": action, "data": {}}
         self.my_api.bot.send_message(call.message.chat.id, "✍️ Введи название продукта:")
@@ -151,6 +171,7 @@ class SendExec:
             if step == "name":
                 state["data"]["name"] = message.text.strip()
                 state["step"] = "quantity"
+                self.user_states[user_id] = state
                 self.my_api.bot.send_message(message.chat.id, "✍️ Введи количество:")
             elif step == "quantity":
                 try:
@@ -159,11 +180,13 @@ class SendExec:
                     self.my_api.bot.send_message(message.chat.id, "❗ Нужно целое число.")
                     return
                 state["step"] = "unit"
+                self.user_states[user_id] = state
                 self.my_api.bot.send_message(
                     message.chat.id, "✍️ Введи единицу измерения (шт, кг, л...) или поставьте \"-\":")
             elif step == "unit":
                 state["data"]["unit"] = message.text.strip() or "шт"
                 state["step"] = "expires"
+                self.user_states[user_id] = state
                 self.my_api.bot.send_message(message.chat.id, "✍️ Введи срок годности (YYYY-MM-DD) или поставьте \"-\":")
             elif step == "expires":
                 # ! Как можно оставить пустым???
@@ -174,11 +197,33 @@ class SendExec:
                 self.my_api.bot.send_message(message.chat.id, result)
                 self.user_states[user_id] = {"fridge_id": fridge_id}
 
+        # --- добавление списком ---
+        elif action == "bulk":
+            if step == "list":
+                items, skipped = [], []
+                for line in message.text.splitlines():
+                    if not line.strip():
+                        continue
+                    item = parse_product_line(line)
+                    if item is None:
+                        skipped.append(line.strip())
+                    else:
+                        items.append(item)
+                if not items:
+                    self.my_api.bot.send_message(message.chat.id, "❗ Не удалось распознать ни одного продукта.")
+                    return
+                result = self.my_api.add_products(fridge_id, items)
+                if skipped:
+                    result += "\n\n❗ Не распознаны строки:\n" + "\n".join(skipped)
+                self.my_api.bot.send_message(message.chat.id, result)
+                self.user_states[user_id] = {"fridge_id": fridge_id}
+
         # --- удаление продукта ---
         elif action == "remove":
             if step == "name":
                 state["data"]["name"] = message.text.strip()
                 state["step"] = "quantity"
+                self.user_states[user_id] = state
                 self.my_api.bot.send_message(message.chat.id, "✍️ Введи количество для удаления:")
             elif step == "quantity":
                 try:
@@ -213,14 +258,25 @@ class SendExec:
             temp_system = [{"role": "system", "content": "Содержимое холодильника: \n" + product_list}]
         recipes_prompt = "\n---\n".join([m["content"] for m in convo + current_msg])
         # print(recipes_prompt)
-        recipes = RAGService().get_context(recipes_prompt, need_to_translate=True)
+        recommendation = self.recommender.get(fridge_id) if fridge_id else None
+        fridge_recipes = ""
+        # Заранее подобранные по холодильнику рецепты заменяют поиск только для общего
+        # «что приготовить?» в начале диалога; на конкретный вопрос ищем по нему самому
+        if recommendation and recommendation["context"] and not convo and is_generic_ask(message.text):
+            recipes = recommendation["context"]
+        else:
+            recipes = RAGService().get_context(recipes_prompt, need_to_translate=True)
+            if recommendation and recommendation["titles"]:
+                fridge_recipes = "# Блюда, подходящие к содержимому холодильника:\n" + \
+                                 "\n".join(f"• {title}" for title in recommendation["titles"]) + "\n\n"
 
         system_prompt = "Ты — кулинарных помощник, который отвечает на вопросы о рецептах. " + \
                         "Всегда отвечай полностью на русском. " + \
                         "Не давай никаких рекомендаций, кроме кулинарных.\n\n" + \
                         "Чтобы ответ был более точным, используй следующую информацию:\n\n" + \
                         "# Содержимое холодильника пользователя:\n" + product_list + "\n\n" + \
-                        "# Релевантные рецепты:\n" + recipes + "\n\n"
+                        "# Релевантные рецепты:\n" + recipes + "\n\n" + \
+                        fridge_recipes
         system_prompt = [{"role": "system", "content": system_prompt}]
 
         full_conversation = system_prompt + convo + current_msg
@@ -0,0 +1,141 @@
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from pathlib import Path
+
+
+STATE_DB = Path(os.getenv("STATE_DB", "./state.db"))
+
+
+class StateStore:
+    """
+    Общее локальное хранилище (SQLite) для нескольких процессов бота.
+
+    Хранит JSON-документы по ключу (каждый холодильник — отдельная запись),
+    сообщения диалогов построчно и состояния диалогов пользователей.
+    Каждый процесс открывает своё соединение.
+    """
+
+    def __init__(self, path: Path = STATE_DB):
+        self.path = Path(path)
+        self.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS user_states (user_id TEXT PRIMARY KEY, state TEXT NOT NULL)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS messages_user_id ON messages (user_id)")
+        # Соединение общее для потоков процесса: транзакцию держит один поток
+        self.lock = threading.RLock()
+        self._depth = 0
+
+    @contextmanager
+    def transaction(self):
+        # BEGIN IMMEDIATE сразу берёт блокировку на запись: два воркера
+        # не смогут одновременно прочитать и перезаписать один документ.
+        with self.lock:
+            if self._depth == 0:
+                self.conn.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.conn.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self.conn.execute("COMMIT")
+
+    def execute(self, sql: str, params: tuple = ()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def load(self, key: str, default=None):
+        rows = self.execute("SELECT value FROM documents WHERE key = ?", (key,))
+        return json.loads(rows[0][0]) if rows else default
+
+    def save(self, key: str, value):
+        self.execute(
+            "INSERT INTO documents (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, json.dumps(value, ensure_ascii=False)),
+        )
+
+    def load_prefix(self, prefix: str) -> list[tuple[str, object]]:
+        rows = self.execute(
+            "SELECT key, value FROM documents WHERE substr(key, 1, ?) = ? ORDER BY key", (len(prefix), prefix))
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def delete(self, key: str):
+        self.execute("DELETE FROM documents WHERE key = ?", (key,))
+
+    def add_message(self, user_id, role: str, content: str):
+        self.execute("INSERT INTO messages (user_id, role, content) VALUES (?, ?, ?)", (str(user_id), role, content))
+
+    def get_messages(self, user_id) -> list[dict[str, str]]:
+        rows = self.execute("SELECT role, content FROM messages WHERE user_id = ? ORDER BY id", (str(user_id),))
+        return [{"role": role, "content": content} for role, content in rows]
+
+    def clear_messages(self, user_id):
+        self.execute("DELETE FROM messages WHERE user_id = ?", (str(user_id),))
+
+    def get_state(self, user_id):
+        rows = self.execute("SELECT state FROM user_states WHERE user_id = ?", (str(user_id),))
+        return json.loads(rows[0][0]) if rows else None
+
+    def set_state(self, user_id, state: dict):
+        self.execute(
+            "INSERT INTO user_states (user_id, state) VALUES (?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET state = excluded.state",
+            (str(user_id), json.dumps(state, ensure_ascii=False)),
+        )
+
+    def delete_state(self, user_id):
+        self.execute("DELETE FROM user_states WHERE user_id = ?", (str(user_id),))
+
+    def iter_states(self):
+        for (user_id,) in self.execute("SELECT user_id FROM user_states"):
+            yield user_id
+
+
+class UserStates(MutableMapping):
+    """
+    Словарь состояний пользователей поверх StateStore.
+
+    Повторяет интерфейс dict, который раньше жил в SendExec.user_states.
+    Значения возвращаются копиями, поэтому изменённое состояние нужно
+    записать обратно: user_states[user_id] = state.
+    """
+
+    def __init__(self, store: StateStore):
+        self.store = store
+
+    def __getitem__(self, user_id):
+        state = self.store.get_state(user_id)
+        if state is None:
+            raise KeyError(user_id)
+        return state
+
+    def __setitem__(self, user_id, state):
+        self.store.set_state(user_id, state)
+
+    def __delitem__(self, user_id):
+        if self.store.get_state(user_id) is None:
+            raise KeyError(user_id)
+        self.store.delete_state(user_id)
+
+    def __iter__(self):
+        return self.store.iter_states()
+
+    def __len__(self):
+        return self.store.execute("SELECT COUNT(*) FROM user_states")[0][0]
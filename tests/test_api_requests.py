@@ -0,0 +1,28 @@
+import pytest
+
+from src.api_requests import parse_product_line
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("молоко 2 л 2026-10-25", {"name": "молоко", "quantity": 2, "unit": "л", "expires": "2026-10-25"}),
+    ("яйца 10", {"name": "яйца", "quantity": 10, "unit": "шт", "expires": None}),
+    ("сыр, 200г", {"name": "сыр", "quantity": 200, "unit": "г", "expires": None}),
+    ("хлеб", {"name": "хлеб", "quantity": 1, "unit": "шт", "expires": None}),
+    ("- кефир 2026-11-01", {"name": "кефир", "quantity": 1, "unit": "шт", "expires": "2026-11-01"}),
+    ("куриное филе 1 кг", {"name": "куриное филе", "quantity": 1, "unit": "кг", "expires": None}),
+    ("йогурт — 4 шт — 2026-11-01", {"name": "йогурт", "quantity": 4, "unit": "шт", "expires": "2026-11-01"}),
+])
+def test_parse_product_line(line, expected):
+    assert parse_product_line(line) == expected
+
+
+@pytest.mark.parametrize("line", [
+    "",
+    " - ",
+    "молоко 1,5 л",
+    "молоко 2.5 л",
+    "молоко 2 л 2026-13-45",
+    "сметана 2026-02-30",
+])
+def test_parse_product_line_rejects(line):
+    assert parse_product_line(line) is None
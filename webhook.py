@@ -0,0 +1,153 @@
+"""
+Webhook-режим: один HTTP-приёмник и несколько процессов-воркеров.
+
+Обновления одного пользователя всегда попадают в один и тот же воркер
+(user_id % WEBHOOK_WORKERS). Внутри воркера обработчики выполняются пулом из
+WEBHOOK_THREADS потоков, но обновления одного пользователя идут строго по
+порядку, поэтому многошаговые сценарии добавления и удаления продуктов не
+перемешиваются, а долгий ответ LLM не блокирует остальных пользователей.
+Состояния диалогов и данные холодильников лежат в общем StateStore (SQLite),
+так что воркеры видят изменения друг друга.
+
+ThreadingHTTPServer принимает только HTTP: перед ним нужен TLS-терминатор
+(nginx, caddy и т.п.), потому что Telegram отправляет webhook только по HTTPS.
+"""
+
+import json
+import multiprocessing as mp
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import telebot
+from loguru import logger
+from telebot import types
+
+from main import build_bot, get_token
+from src.llm import setup_database
+from src.storage import STATE_DB, StateStore
+
+
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", str(os.cpu_count() or 1)))
+WEBHOOK_THREADS = int(os.getenv("WEBHOOK_THREADS", "4"))
+
+
+def get_user_id(update: dict):
+    for kind in ("message", "callback_query"):
+        if kind in update:
+            return update[kind]["from"]["id"]
+    return update.get("update_id", 0)
+
+
+def worker(queue, token: str, db_path: str):
+    # Каждый процесс открывает своё соединение с хранилищем и своего бота
+    store = StateStore(db_path)
+    bot = build_bot(token, store, threaded=False)
+    pool = ThreadPoolExecutor(max_workers=WEBHOOK_THREADS)
+    # Очередь обновлений на пользователя; пока она существует, её разбирает ровно один поток
+    lanes = {}
+    lock = threading.Lock()
+
+    def drain(user_id):
+        while True:
+            with lock:
+                if not lanes[user_id]:
+                    del lanes[user_id]
+                    return
+                raw = lanes[user_id].popleft()
+            try:
+                bot.process_new_updates([types.Update.de_json(raw)])
+            except Exception as e:
+                logger.error(f"Error processing update: {e}")
+
+    while True:
+        item = queue.get()
+        if item is None:
+            break
+        user_id, raw = item
+        with lock:
+            if user_id in lanes:
+                lanes[user_id].append(raw)
+                continue
+            lanes[user_id] = deque([raw])
+        pool.submit(drain, user_id)
+    pool.shutdown(wait=True)
+    bot.my_send.recommender.stop()
+
+
+def make_handler(queues: list, path: str):
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != path:
+                self.send_response(404)
+                self.end_headers()
+                return
+            if WEBHOOK_SECRET and self.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+                self.send_response(403)
+                self.end_headers()
+                return
+
+            raw = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+            try:
+                update = json.loads(raw)
+            except ValueError:
+                self.send_response(400)
+                self.end_headers()
+                return
+
+            user_id = get_user_id(update)
+            queues[user_id % len(queues)].put((user_id, raw))
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    return WebhookHandler
+
+
+def main():
+    token = get_token()
+    if not WEBHOOK_URL:
+        raise ValueError("No WEBHOOK_URL provided in environment variables")
+
+    setup_database()
+    # Создаём схему до старта воркеров, чтобы они не соревновались за неё
+    StateStore(STATE_DB)
+
+    path = f"/{token}/"
+    # spawn, а не fork: родитель уже открыл Chroma (SQLite, нативные потоки) и, возможно,
+    # загрузил эмбеддер — эти ресурсы нельзя использовать в форкнутом процессе
+    ctx = mp.get_context("spawn")
+    queues = [ctx.Queue() for _ in range(WEBHOOK_WORKERS)]
+    processes = [ctx.Process(target=worker, args=(q, token, str(STATE_DB)), daemon=True) for q in queues]
+    for p in processes:
+        p.start()
+
+    bot = telebot.TeleBot(token, threaded=False)
+    bot.remove_webhook()
+    bot.set_webhook(
+        url=WEBHOOK_URL.rstrip("/") + path,
+        secret_token=WEBHOOK_SECRET or None,
+        allowed_updates=['message', 'callback_query']
+    )
+
+    server = ThreadingHTTPServer((WEBHOOK_HOST, WEBHOOK_PORT), make_handler(queues, path))
+    print(f"✅ Webhook is running on {WEBHOOK_HOST}:{WEBHOOK_PORT} with {WEBHOOK_WORKERS} workers...")
+    try:
+        server.serve_forever()
+    finally:
+        for q in queues:
+            q.put(None)
+        for p in processes:
+            p.join()
+
+
+if __name__ == "__main__":
+    main()